@@ -1,40 +1,122 @@
 # app.py
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, make_response, render_template, request, jsonify
+from flask_compress import Compress
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cachetools import TTLCache
+from collections import defaultdict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import atexit
+import hashlib
+import heapq
 import json
+import orjson
 import os
-import time # For adding a small delay to respect API rate limits
+import threading
+import types
 
 app = Flask(__name__)
+Compress(app) # Brotli/gzip-compress HTML responses based on the client's Accept-Encoding
 
 # Base URL for the Jikan API
 JIKAN_API_URL = "https://api.jikan.moe/v4"
 
-# Global variable to store genre map (initialized once)
-# This avoids fetching the genre list repeatedly
-GENRE_NAME_TO_ID_MAP = {}
+# (connect, read) timeout in seconds for every call to the Jikan API
+REQUEST_TIMEOUT = (3.05, 10)
+# Shorter, single-attempt timeout for the genre fetch at import time, which runs
+# before gunicorn workers start heartbeating and must finish well inside --timeout
+STARTUP_TIMEOUT = (3.05, 5)
+
+# Shared HTTP session so calls to api.jikan.moe reuse pooled keep-alive
+# connections instead of paying a fresh TCP + TLS handshake every time.
+# Transient failures (rate limiting, server errors) are retried with backoff.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+atexit.register(SESSION.close)
+
+# In-memory caches of decoded Jikan responses, keyed by request URL.
+# Search results are kept for an hour; the genre list rarely changes, so a day.
+API_CACHE = TTLCache(maxsize=2048, ttl=3600)
+GENRE_CACHE = TTLCache(maxsize=1, ttl=86400)
+# Futures for fetches currently in flight, keyed by URL, so concurrent callers
+# asking for the same URL share one outbound request instead of duplicating it.
+_inflight = {}
+# Longest a caller waits on someone else's in-flight fetch: the session's full retry
+# budget (1 try + 3 retries, each up to connect + read timeout) plus backoff slack
+INFLIGHT_WAIT_TIMEOUT = 4 * sum(REQUEST_TIMEOUT) + 5
+_cache_lock = threading.Lock() # Guards both the caches and _inflight (TTLCache is not thread-safe)
+
+# Global read-only genre map, populated once at import time (see _bootstrap_genre_map)
+# This avoids fetching the genre list on the request path
+GENRE_NAME_TO_ID_MAP = types.MappingProxyType({})
+
+def _cached_get_json(url, cache=API_CACHE, timeout=REQUEST_TIMEOUT, retry=True):
+    """
+    Returns the decoded JSON body for a GET request, served from cache when possible.
+    If the same URL is already being fetched, waits for that request instead of issuing another.
+    Only successful responses are cached; request and decode errors propagate to every waiting caller.
+    With retry=False the request is a single attempt that bypasses the session's retry policy.
+    """
+    with _cache_lock:
+        data = cache.get(url)
+        if data is not None:
+            return data
+        future = _inflight.get(url)
+        is_owner = future is None
+        if is_owner:
+            future = _inflight[url] = Future()
+
+    if not is_owner:
+        try:
+            return future.result(timeout=INFLIGHT_WAIT_TIMEOUT) # Re-raises the owner's exception if its fetch failed
+        except FutureTimeoutError:
+            raise requests.exceptions.Timeout(f"Timed out waiting for in-flight request to {url}")
 
-def get_genre_map():
+    try:
+        http_get = SESSION.get if retry else requests.get
+        response = http_get(url, timeout=timeout)
+        response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
+        # orjson parses the raw bytes directly and is much faster than response.json();
+        # its decode errors subclass json.JSONDecodeError, so callers' handlers still apply.
+        data = orjson.loads(response.content)
+    except BaseException as e:
+        # Always resolve the future so waiters never hang. Interruptions that aren't
+        # ordinary errors (e.g. gevent.Timeout, GreenletExit) belong to the owner only,
+        # so waiters get a request error instead of having them re-raised.
+        if isinstance(e, Exception):
+            future.set_exception(e)
+        else:
+            future.set_exception(requests.exceptions.RequestException(f"In-flight request to {url} was interrupted"))
+        raise
+    else:
+        with _cache_lock:
+            cache[url] = data
+        future.set_result(data)
+        return data
+    finally:
+        with _cache_lock:
+            _inflight.pop(url, None)
+
+def get_genre_map(timeout=REQUEST_TIMEOUT, retry=True):
     """
     Fetches all anime genres from Jikan API and creates a name-to-ID map.
     This helps in accurate genre-based filtering.
+    timeout and retry are passed through to the HTTP request (see _cached_get_json).
     """
-    global GENRE_NAME_TO_ID_MAP
-    if GENRE_NAME_TO_ID_MAP: # If already populated, return it
-        return GENRE_NAME_TO_ID_MAP
-
     print("Fetching anime genre list...")
     genre_api_url = f"{JIKAN_API_URL}/genres/anime"
     try:
-        response = requests.get(genre_api_url)
-        response.raise_for_status()
-        data = response.json()
+        data = _cached_get_json(genre_api_url, cache=GENRE_CACHE, timeout=timeout, retry=retry)
 
         if data and data.get('data'):
-            for genre in data['data']:
-                GENRE_NAME_TO_ID_MAP[genre['name'].lower()] = genre['mal_id']
-            print(f"Successfully fetched {len(GENRE_NAME_TO_ID_MAP)} genres.")
-            return GENRE_NAME_TO_ID_MAP
+            genre_map = {genre['name'].lower(): genre['mal_id'] for genre in data['data']}
+            print(f"Successfully fetched {len(genre_map)} genres.")
+            return genre_map
         else:
             print("No genre data found from API.")
             return {}
@@ -48,6 +130,21 @@ def get_genre_map():
         print(f"An unexpected error occurred while fetching genres: {e}")
         return {}
 
+def _bootstrap_genre_map(timeout=REQUEST_TIMEOUT, retry=True):
+    """
+    Populates the global genre map as a read-only mapping that is safe to share between threads.
+    get_genre_map() handles its own errors, so an unreachable API leaves the map empty
+    instead of failing the import.
+    """
+    global GENRE_NAME_TO_ID_MAP
+    GENRE_NAME_TO_ID_MAP = types.MappingProxyType(get_genre_map(timeout=timeout, retry=retry))
+    return GENRE_NAME_TO_ID_MAP
+
+# Load the genre map when the app starts so the first user request doesn't pay for it.
+# This is a quick one-shot attempt: a slow Jikan must not stall worker boot, and
+# recommend_anime_by_genre retries (with the normal policy) if it comes back empty.
+_bootstrap_genre_map(timeout=STARTUP_TIMEOUT, retry=False)
+
 def get_anime_data(search_query):
     """
     Fetches anime data from the Jikan API (MyAnimeList unofficial API).
@@ -58,13 +155,12 @@ def get_anime_data(search_query):
     Returns:
         dict: A dictionary containing anime data if found, otherwise None.
     """
-    api_url = f"{JIKAN_API_URL}/anime?q={search_query}&limit=10"
+    # Only the first match is used, so ask for just one (URL-encoding the user's query)
+    api_url = f"{JIKAN_API_URL}/anime?q={requests.utils.quote(search_query)}&limit=1&sfw=true"
     print(f"Searching for anime: '{search_query}'...")
 
     try:
-        response = requests.get(api_url)
-        response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
-        data = response.json()
+        data = _cached_get_json(api_url)
 
         if data and data.get('data'):
             return data['data'][0] # Return the first result's data
@@ -82,6 +178,36 @@ def get_anime_data(search_query):
         print(f"An unexpected error occurred: {e}")
         return None
 
+def fetch_top_anime_for_genres(genre_ids):
+    """
+    Fetches the top-scored anime for one or more genres from the Jikan API.
+
+    Args:
+        genre_ids (list): MyAnimeList genre IDs, sent as a single comma-separated filter.
+
+    Returns:
+        list: A list of anime data dictionaries, or an empty list on failure.
+    """
+    genre_csv = ",".join(map(str, genre_ids))
+    # Search for anime by genre IDs, ordered by score
+    search_url = f"{JIKAN_API_URL}/anime?genres={genre_csv}&order_by=score&sort=desc&limit=25"
+
+    try:
+        data = _cached_get_json(search_url)
+
+        if data and data.get('data'):
+            return data['data']
+        return []
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching genre-based recommendations for genre IDs {genre_csv}: {e}")
+        return []
+    except json.JSONDecodeError:
+        print(f"Error decoding JSON for genre IDs {genre_csv} recommendations.")
+        return []
+    except Exception as e:
+        print(f"An unexpected error occurred during genre recommendation for genre IDs {genre_csv}: {e}")
+        return []
+
 def recommend_anime_by_genre(favorite_anime_genre_names, num_recommendations=10):
     """
     Recommends anime based on shared genres using genre IDs for better accuracy.
@@ -96,15 +222,16 @@ def recommend_anime_by_genre(favorite_anime_genre_names, num_recommendations=10)
     if not favorite_anime_genre_names:
         return []
 
-    genre_map = get_genre_map()
+    # Retry the bootstrap only if the genre list couldn't be fetched at startup
+    genre_map = GENRE_NAME_TO_ID_MAP or _bootstrap_genre_map()
     if not genre_map:
         print("Cannot recommend: Genre map not available.")
         return []
 
     # Convert favorite anime genre names to their corresponding IDs
-    favorite_anime_genre_ids = [
-        genre_map[g.lower()] for g in favorite_anime_genre_names if g.lower() in genre_map
-    ]
+    # (lowercase each name once; the map keys were lowercased when it was built)
+    lowered_genre_names = [g.lower() for g in favorite_anime_genre_names]
+    favorite_anime_genre_ids = [genre_map[g] for g in lowered_genre_names if g in genre_map]
 
     if not favorite_anime_genre_ids:
         print("No valid genre IDs found for your favorite anime.")
@@ -112,77 +239,77 @@ def recommend_anime_by_genre(favorite_anime_genre_names, num_recommendations=10)
 
     print(f"\nLooking for anime similar to genres (IDs): {favorite_anime_genre_ids}")
     
-    # Use a dictionary to store potential recommendations with their genre overlap count
-    # {anime_id: {'title': 'Anime Title', 'overlap_count': X}}
-    potential_recommendations = {}
+    # Accumulate potential recommendations with their genre overlap count, merging
+    # anime that show up in more than one query into a single entry
+    # {anime_id: {'title': 'Anime Title', 'overlap_count': X, 'score': Y}}
+    potential_recommendations = defaultdict(lambda: {'title': '', 'overlap_count': 0, 'score': 0.0})
     
     # To avoid hitting rate limits, we'll fetch a broad list and then filter/score
-    # We can query by multiple genre IDs (comma-separated) for a more targeted search
-    # However, Jikan's /anime endpoint only takes one genre ID at a time in the 'genres' parameter.
-    # So, we'll iterate through the top genres and combine results.
+    # Jikan's /anime endpoint accepts multiple genre IDs (comma-separated) in the
+    # 'genres' parameter, so all of the top genres go into a single query.
 
     # Prioritize searching by the most relevant genres first (e.g., first 3-5)
     genres_to_query = favorite_anime_genre_ids[:7] # Limit to top few genres for API calls
 
-    for genre_id in genres_to_query:
-        # Search for anime by specific genre ID, ordered by score
-        search_url = f"{JIKAN_API_URL}/anime?genres={genre_id}&order_by=score&sort=desc&limit=25"
-        
-        try:
-            response = requests.get(search_url)
-            response.raise_for_status()
-            data = response.json()
-
-            if data and data.get('data'):
-                for anime in data['data']:
-                    anime_id = anime['mal_id']
-                    if anime_id in potential_recommendations:
-                        continue # Already processed this anime
-
-                    # Get genres of the current anime being considered
-                    current_anime_genres = [g['mal_id'] for g in anime.get('genres', [])]
-                    
-                    # Calculate genre overlap with the user's favorite anime's genres
-                    overlap_count = len(set(favorite_anime_genre_ids).intersection(current_anime_genres))
-
-                    if overlap_count > 0: # Only consider if there's at least one shared genre
-                        potential_recommendations[anime_id] = {
-                            'title': anime['title'],
-                            'overlap_count': overlap_count,
-                            'score': anime.get('score', 0) # Include score for secondary sorting
-                        }
-            time.sleep(0.5) # Be kind to the API, add a small delay between requests
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching genre-based recommendations for genre ID {genre_id}: {e}")
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON for genre ID {genre_id} recommendations.")
-        except Exception as e:
-            print(f"An unexpected error occurred during genre recommendation for genre ID {genre_id}: {e}")
+    # Build the lookup set once instead of once per candidate anime
+    favorite_ids_set = frozenset(favorite_anime_genre_ids)
+
+    genre_results = [fetch_top_anime_for_genres(genres_to_query)]
+
+    # If the combined query is too narrow, top up with the leading genre alone
+    # (still at most two API calls instead of one per genre)
+    if len(genres_to_query) > 1 and len(genre_results[0]) < num_recommendations:
+        genre_results.append(fetch_top_anime_for_genres(genres_to_query[:1]))
+
+    for anime_list in genre_results:
+        for anime in anime_list:
+            # Get genres of the current anime being considered
+            current_anime_genres = [g['mal_id'] for g in anime.get('genres', [])]
+
+            # Calculate genre overlap with the user's favorite anime's genres
+            # (iterate the anime's few genres against the O(1) frozenset lookup)
+            overlap_count = sum(1 for g in current_anime_genres if g in favorite_ids_set)
+
+            if overlap_count > 0: # Only consider if there's at least one shared genre
+                entry = potential_recommendations[anime['mal_id']]
+                entry['title'] = anime['title']
+                entry['overlap_count'] = max(entry['overlap_count'], overlap_count)
+                entry['score'] = anime.get('score') or 0.0 # Include score for secondary sorting (Jikan may send null)
 
     # Sort potential recommendations:
     # 1. By overlap count (descending)
     # 2. By score (descending)
-    sorted_recommendations = sorted(
+    # Only the top few are needed, so select them with a bounded heap
+    # instead of sorting every candidate.
+    top_recommendations = heapq.nlargest(
+        num_recommendations,
         potential_recommendations.values(),
-        key=lambda x: (x['overlap_count'], x['score']),
-        reverse=True
+        key=lambda x: (x['overlap_count'], x['score'])
     )
 
     # Extract titles up to the requested number of recommendations
-    recommended_titles = [rec['title'] for rec in sorted_recommendations[:num_recommendations]]
+    recommended_titles = [rec['title'] for rec in top_recommendations]
     return recommended_titles
 
+# The landing page never changes, so render it once at startup and serve the
+# cached bytes (with an ETag for conditional requests) instead of re-rendering.
+with app.test_request_context():
+    EMPTY_PAGE = render_template('index.html',
+                                 favorite_anime=None,
+                                 recommendations=None,
+                                 message="Enter an anime you enjoy to get recommendations!").encode('utf-8')
+EMPTY_ETAG = hashlib.md5(EMPTY_PAGE).hexdigest()
+
 @app.route('/', methods=['GET'])
 def index():
     """
-    Renders the main page of the application.
+    Serves the pre-rendered main page of the application.
+    Answers with 304 Not Modified when the client's If-None-Match matches.
     """
-    # Ensure genre map is loaded when the app starts or index page is accessed
-    get_genre_map()
-    return render_template('index.html',
-                           favorite_anime=None,
-                           recommendations=None,
-                           message="Enter an anime you enjoy to get recommendations!")
+    response = Response(EMPTY_PAGE, mimetype='text/html')
+    response.set_etag(EMPTY_ETAG)
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response.make_conditional(request)
 
 @app.route('/recommend', methods=['POST'])
 def recommend():
@@ -213,130 +340,15 @@ def recommend():
         else:
             message = f"Could not find details for '{user_anime_name}'. Please try another name."
 
-    return render_template('index.html',
-                           favorite_anime=favorite_anime_data,
-                           recommendations=recommendations,
-                           message=message)
+    response = make_response(render_template('index.html',
+                                             favorite_anime=favorite_anime_data,
+                                             recommendations=recommendations,
+                                             message=message))
+    # Results depend on the submitted form, so only the user's own browser may cache them
+    response.headers['Cache-Control'] = 'private, max-age=60'
+    return response
 
 if __name__ == '__main__':
-    # Create the 'templates' directory if it doesn't exist
-    templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
-    os.makedirs(templates_dir, exist_ok=True)
-
-    # Define the content for index.html
-    index_html_content = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Anime Recommender</title>
-        <!-- Tailwind CSS CDN for easy styling -->
-        <script src="https://cdn.tailwindcss.com"></script>
-        <style>
-            /* Custom styles for Inter font and background */
-            body {
-                font-family: 'Inter', sans-serif;
-                background-color: #0d1117; /* Darker background, GitHub-like */
-                color: #c9d1d9; /* Lighter text for contrast */
-                background-image: radial-gradient(at 0% 0%, hsla(215, 80%, 20%, 0.3) 0, transparent 50%),
-                                  radial-gradient(at 100% 100%, hsla(280, 80%, 20%, 0.3) 0, transparent 50%);
-            }
-            /* Custom scrollbar for better aesthetics */
-            ::-webkit-scrollbar {
-                width: 8px;
-            }
-            ::-webkit-scrollbar-track {
-                background: #2d3748; /* Darker track */
-                border-radius: 10px;
-            }
-            ::-webkit-scrollbar-thumb {
-                background: #4a5568; /* Lighter thumb */
-                border-radius: 10px;
-            }
-            ::-webkit-scrollbar-thumb:hover {
-                background: #6b7280; /* Even lighter on hover */
-            }
-            /* Keyframe for subtle pulse animation on button */
-            @keyframes pulse-once {
-                0% { transform: scale(1); }
-                50% { transform: scale(1.02); }
-                100% { transform: scale(1); }
-            }
-            .animate-pulse-once {
-                animation: pulse-once 0.5s ease-in-out;
-            }
-        </style>
-    </head>
-    <body class="flex items-center justify-center min-h-screen p-4">
-        <div class="bg-gray-900 bg-opacity-80 backdrop-blur-sm p-8 rounded-xl shadow-2xl w-full max-w-2xl border border-gray-700">
-            <h1 class="text-5xl font-extrabold text-center text-purple-400 mb-4 animate-fade-in-down">
-                <span class="inline-block transform rotate-6 mr-3 text-yellow-300">✨</span> Anime Nexus <span class="inline-block transform -rotate-6 ml-3 text-pink-300">🌌</span>
-            </h1>
-            <p class="text-center text-gray-400 text-lg mb-8">
-                Your gateway to discovering new anime. 
-            </p>
-
-            <form action="/recommend" method="post" class="mb-10 flex flex-col sm:flex-row gap-4">
-                <input type="text" name="anime_name" placeholder="Enter an anime you love (e.g.One Piece)"
-                       class="flex-grow p-4 rounded-lg bg-gray-700 border border-gray-600 focus:outline-none focus:ring-3 focus:ring-purple-500 text-white placeholder-gray-400 text-lg transition duration-300 ease-in-out">
-                <button type="submit"
-                        class="px-8 py-4 bg-gradient-to-r from-purple-600 to-indigo-600 text-white font-bold rounded-lg shadow-lg hover:shadow-xl focus:outline-none focus:ring-3 focus:ring-purple-500 focus:ring-offset-2 focus:ring-offset-gray-900 transition duration-300 ease-in-out transform hover:scale-105 active:scale-95 animate-pulse-once">
-                    Find My Next Anime!
-                </button>
-            </form>
-
-            {% if message %}
-                <p class="text-center text-yellow-300 mb-8 text-xl font-semibold bg-gray-800 p-3 rounded-md border border-yellow-500">{{ message }}</p>
-            {% endif %}
-
-            {% if favorite_anime %}
-                <div class="mb-8 bg-gray-800 p-6 rounded-xl shadow-lg border border-gray-700 transform transition duration-300 hover:scale-[1.01]">
-                    <h2 class="text-3xl font-bold text-purple-300 mb-4 flex items-center">
-                        <span class="mr-3 text-pink-400">💖</span> Your Anime: {{ favorite_anime.title }}
-                    </h2>
-                    <p class="text-gray-300 text-lg mb-2">
-                        <span class="font-semibold text-gray-200">Score:</span>
-                        <span class="text-yellow-400">{{ favorite_anime.score if favorite_anime.score else 'N/A' }}</span>
-                    </p>
-                    <div class="mb-4 flex flex-wrap gap-2">
-                        <span class="font-semibold text-gray-200 text-lg">Genres:</span>
-                        {% for genre in favorite_anime.genres %}
-                            <span class="inline-block bg-purple-700 text-purple-100 text-sm px-3 py-1 rounded-full shadow-md">{{ genre.name }}</span>
-                        {% endfor %}
-                    </div>
-                    <p class="text-gray-400 text-base leading-relaxed">
-                        <span class="font-semibold text-gray-200">Synopsis:</span> {{ favorite_anime.synopsis[:250] }}...
-                        <a href="{{ favorite_anime.url }}" target="_blank" class="text-purple-400 hover:underline font-medium">Read more on MyAnimeList</a>
-                    </p>
-                </div>
-            {% endif %}
-
-            {% if recommendations %}
-                <div class="bg-gray-800 p-6 rounded-xl shadow-lg border border-gray-700 transform transition duration-300 hover:scale-[1.01]">
-                    <h2 class="text-3xl font-bold text-green-300 mb-4 flex items-center">
-                        <span class="mr-3 text-cyan-400">✨</span> Recommended for You:
-                    </h2>
-                    <ul class="list-none text-gray-300 space-y-3">
-                        {% for rec_title in recommendations %}
-                            <li class="flex items-center bg-gray-700 p-3 rounded-md shadow-sm border border-gray-600">
-                                <span class="text-green-400 mr-3 text-xl font-bold">»</span> {{ rec_title }}
-                            </li>
-                        {% endfor %}
-                    </ul>
-                </div>
-            {% endif %}
-        </div>
-    </body>
-    </html>
-    """
-
-    # Write the HTML content to index.html inside the templates directory
-    with open(os.path.join(templates_dir, 'index.html'), 'w', encoding='utf-8') as f:
-        f.write(index_html_content)
-
-    # Initialize the genre map when the app starts
-    get_genre_map()
-
-    # Run the Flask application
-    app.run(debug=True)
+    # Run the Flask development server (local use only; production runs
+    # under gunicorn via wsgi.py). Debug mode is opt-in with FLASK_DEV=1.
+    app.run(debug=bool(os.environ.get('FLASK_DEV')))
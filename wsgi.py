@@ -0,0 +1,9 @@
+# wsgi.py
+# Production entrypoint for gunicorn with gevent workers:
+#   gunicorn -k gevent -w $(nproc) --worker-connections 1000 wsgi:app
+# Patch the standard library first so the blocking requests calls to the
+# Jikan API yield to other greenlets instead of stalling the worker.
+from gevent import monkey
+monkey.patch_all()
+
+from app import app